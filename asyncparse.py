@@ -0,0 +1,63 @@
+#! /usr/bin/env python3
+
+import asyncio
+from typing import *
+from grammar import *
+from production import *
+
+from ll1 import *
+from lrparser import *
+
+__all__ = ['parse_async']
+
+
+async def parse_async(parser: Union[LRPushParser, LL1PushParser],
+                      chunks: AsyncIterable[Iterable[Union[Token, str]]]):
+    """
+    Feed every chunk of tokens from `chunks` to the push parser as it
+    arrives, then close it and return its result. No thread is held while
+    waiting, so many streams can be parsed in one event loop.
+    """
+    async for chunk in chunks:
+        parser.feed(chunk)
+    return parser.close()
+
+
+if __name__ == '__main__':
+    from lalr import *
+
+    lalr = LALRMachine('S\'') \
+        .add_production(Production('S\'', ['S'])) \
+        .add_production(Production('S', ['S', '+', 'T'])) \
+        .add_production(Production('S', ['T'])) \
+        .add_production(Production('T', ['(', 'S', ')'])) \
+        .add_production(Production('T', ['a']))
+
+    lalr.calc()
+    lr_parser = LRParser(lalr)
+
+    ll1 = LL1Machine('E') \
+        .add_production(Production("E", ["T", "E'"])) \
+        .add_production(Production("E'", ["+", "T", "E'"])) \
+        .add_production(Production("E'", [])) \
+        .add_production(Production("T", ["(", "E", ")"])) \
+        .add_production(Production("T", ["a"]))
+
+    ll1.calc_table()
+
+    async def connection(ind: int):
+        tokens = ['a'] + ['+', '(', 'a', '+', 'a', ')'] * (ind % 10)
+        for pos in range(0, len(tokens), 3):
+            await asyncio.sleep(0)
+            yield tokens[pos:pos + 3]
+
+    async def main():
+        trees = await asyncio.gather(*(parse_async(LRPushParser(lr_parser), connection(ind))
+                                       for ind in range(1000)))
+        derivations = await asyncio.gather(*(parse_async(LL1PushParser(ll1), connection(ind))
+                                             for ind in range(1000)))
+        print(trees[3].to_string())
+        print(derivations[1])
+        print(sum(tree.size for tree in trees), sum(map(len, derivations)))
+
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+#! /usr/bin/env python3
+
+import os
+import re
+import tempfile
+from time import perf_counter
+from typing import *
+from grammar import *
+
+from lexer import *
+
+
+def regex_tokenize(pattern: Pattern, data: bytes) -> Iterator[Token]:
+    pos = 0
+    for match in pattern.finditer(data):
+        if match.start() != pos:
+            raise ValueError('unexpected character at %d' % pos)
+        pos = match.end()
+        if match.lastgroup != 'space':
+            yield Token(match.lastgroup, match.group().decode())
+    if pos != len(data):
+        raise ValueError('unexpected character at %d' % pos)
+
+
+def timed(func: Callable, *args):
+    begin = perf_counter()
+    ret = func(*args)
+    return ret, perf_counter() - begin
+
+
+def best(func: Callable, repeat: int) -> float:
+    return min(timed(func)[1] for _ in range(repeat))
+
+
+if __name__ == '__main__':
+    lexer = Lexer() \
+        .add_literal('=') \
+        .add_literal('+') \
+        .add_literal(';') \
+        .add_literal('(') \
+        .add_literal(')') \
+        .add_regex('id', r'[a-zA-Z_]\w*') \
+        .add_regex('num', r'\d+') \
+        .add_regex('space', r'\s+', ignore=True)
+    lexer.calc()
+
+    pattern = re.compile(rb'(?P<id>[a-zA-Z_]\w*)|(?P<num>\d+)|(?P<space>\s+)|(?P<sym>[=+;()])')
+
+    line = b'total_%d = count + (offset + 42);\n'
+    data = b''.join(line % ind for ind in range(20000))
+    repeat = 5
+
+    expected = [Token(t.symbol if t.symbol != 'sym' else t.value, t.value) for t in regex_tokenize(pattern, data)]
+    assert list(lexer.tokenize(data)) == expected
+
+    print('%d bytes, %d tokens, best of %d runs' % (len(data), len(expected), repeat))
+
+    regex = best(lambda: sum(1 for _ in regex_tokenize(pattern, data)), repeat)
+    print('  re.finditer          %.4fs' % regex)
+
+    dfa = best(lambda: sum(1 for _ in lexer.tokenize(data)), repeat)
+    print('  Lexer.tokenize      %.4fs (%.2fx re)' % (dfa, dfa / regex))
+
+    with tempfile.NamedTemporaryFile(delete=False) as f:
+        f.write(data)
+    try:
+        mapped = best(lambda: sum(1 for _ in lexer.tokenize_file(f.name)), repeat)
+    finally:
+        os.unlink(f.name)
+    print('  Lexer.tokenize_file %.4fs (%.2fx re)' % (mapped, mapped / regex))
@@ -0,0 +1,76 @@
+#! /usr/bin/env python3
+
+from time import perf_counter
+from typing import *
+from production import *
+
+from lalr import *
+from lrparser import *
+
+
+def same(a: Node, b: Node) -> bool:
+    pending: List[Tuple[Node, Node]] = [(a.unfold(), b.unfold())]
+    while pending:
+        a, b = pending.pop()
+        if a.symbol != b.symbol or a.token != b.token or len(a.children) != len(b.children):
+            return False
+        pending.extend(zip(a.children, b.children))
+    return True
+
+
+def timed(func: Callable, *args):
+    begin = perf_counter()
+    ret = func(*args)
+    return ret, perf_counter() - begin
+
+
+if __name__ == '__main__':
+    left = LALRMachine('P') \
+        .add_production(Production('P', ['L'])) \
+        .add_production(Production('L', ['L', 'St'])) \
+        .add_production(Production('L', ['St'])) \
+        .add_production(Production('St', ['id', '=', 'E', ';'])) \
+        .add_production(Production('E', ['E', '+', 'T'])) \
+        .add_production(Production('E', ['T'])) \
+        .add_production(Production('T', ['(', 'E', ')'])) \
+        .add_production(Production('T', ['id']))
+
+    right = LALRMachine('P') \
+        .add_production(Production('P', ['L'])) \
+        .add_production(Production('L', ['St', 'L'])) \
+        .add_production(Production('L', ['St'])) \
+        .add_production(Production('St', ['id', '=', 'E', ';'])) \
+        .add_production(Production('E', ['T', '+', 'E'])) \
+        .add_production(Production('E', ['T'])) \
+        .add_production(Production('T', ['(', 'E', ')'])) \
+        .add_production(Production('T', ['id']))
+
+    statement = ['id', '=', 'id', '+', '(', 'id', '+', 'id', ')', ';']
+    edit = ['id', '+', 'id']
+    counts = [1000, 4000, 16000]
+    repeat = 10
+
+    for name, machine in [('left recursive', left), ('right recursive', right)]:
+        machine.calc()
+        parser = LRParser(machine)
+        times: Dict[str, List[float]] = {}
+
+        print(name)
+        for count in counts:
+            tokens = statement * count
+            tree, full = timed(parser.parse, tokens)
+
+            print('  %7d tokens: full parse %.4fs' % (len(tokens), full))
+            for where, pos in [('head', 2), ('middle', len(tokens) // 2 + 2), ('tail', len(tokens) - 8)]:
+                best = float('inf')
+                for _ in range(repeat):
+                    new_tree, partial = timed(parser.reparse, tree, pos, pos + 1, edit)
+                    best = min(best, partial)
+                assert same(new_tree, parser.parse(tokens[:pos] + edit + tokens[pos + 1:]))
+                times.setdefault(where, []).append(best)
+                print('    edit at %-6s reparse %.6fs' % (where, best))
+
+        print('  growth from %d to %d tokens (input x%d):' % (
+            counts[0] * len(statement), counts[-1] * len(statement), counts[-1] // counts[0]))
+        for where, values in times.items():
+            print('    %-6s x%.1f' % (where, values[-1] / values[0]))
@@ -4,11 +4,39 @@ from copy import deepcopy
 from typing import *
 from production import *
 
-__all__ = ['Grammar', 'EOF']
+__all__ = ['Grammar', 'Token', 'as_token', 'EOF']
 
 EOF = '#'
 
 
+class Token:
+    __slots__ = ['symbol', 'value']
+
+    def __init__(self, symbol: str, value: Any = None):
+        self.symbol: str = symbol
+        self.value: Any = symbol if value is None else value
+
+    def __eq__(self, other):
+        if not isinstance(other, Token):
+            return NotImplemented
+        return self.symbol == other.symbol and self.value == other.value
+
+    def __hash__(self):
+        return hash((self.symbol, self.value))
+
+    def __str__(self):
+        if self.value == self.symbol:
+            return self.symbol
+        return '%s(%s)' % (self.symbol, self.value)
+
+    def __repr__(self):
+        return str(self)
+
+
+def as_token(x: Union[Token, str]) -> Token:
+    return x if isinstance(x, Token) else Token(x)
+
+
 class Grammar:
     __slots__ = ['target', 'production', 'first', 'follow', 'symbols']
 
@@ -0,0 +1,450 @@
+#! /usr/bin/env python3
+
+import mmap
+from array import array
+from typing import *
+from grammar import *
+from production import *
+
+__all__ = ['Lexer']
+
+BYTES = 256
+
+ESCAPES: Dict[str, Set[int]] = {
+    'd': set(range(ord('0'), ord('9') + 1)),
+    'w': set(range(ord('a'), ord('z') + 1)) | set(range(ord('A'), ord('Z') + 1))
+         | set(range(ord('0'), ord('9') + 1)) | {ord('_')},
+    's': set(map(ord, ' \t\n\r\f\v')),
+    'n': {ord('\n')},
+    't': {ord('\t')},
+    'r': {ord('\r')},
+}
+
+ASCII = set(range(0x80))
+
+TAIL = frozenset(range(0x80, 0xC0))
+
+# Multibyte UTF-8 characters by leading byte, without overlong forms and surrogates
+UTF8_SEQUENCES: List[List[FrozenSet[int]]] = [
+    [frozenset(range(0xC2, 0xE0)), TAIL],
+    [frozenset([0xE0]), frozenset(range(0xA0, 0xC0)), TAIL],
+    [frozenset(range(0xE1, 0xED)), TAIL, TAIL],
+    [frozenset([0xED]), frozenset(range(0x80, 0xA0)), TAIL],
+    [frozenset(range(0xEE, 0xF0)), TAIL, TAIL],
+    [frozenset([0xF0]), frozenset(range(0x90, 0xC0)), TAIL, TAIL],
+    [frozenset(range(0xF1, 0xF4)), TAIL, TAIL, TAIL],
+    [frozenset([0xF4]), frozenset(range(0x80, 0x90)), TAIL, TAIL],
+]
+
+
+class NFA:
+    __slots__ = ['eps', 'edges']
+
+    def __init__(self):
+        self.eps: List[List[int]] = []
+        self.edges: List[List[Tuple[FrozenSet[int], int]]] = []
+
+    def new_state(self) -> int:
+        self.eps.append([])
+        self.edges.append([])
+        return len(self.eps) - 1
+
+    def add_bytes(self, data: bytes) -> Tuple[int, int]:
+        begin = end = self.new_state()
+        for b in data:
+            state = self.new_state()
+            self.edges[end].append((frozenset([b]), state))
+            end = state
+        return begin, end
+
+    def closure(self, states: Iterable[int]) -> FrozenSet[int]:
+        result = set(states)
+        pending = list(result)
+        while pending:
+            for state in self.eps[pending.pop()]:
+                if state not in result:
+                    result.add(state)
+                    pending.append(state)
+        return frozenset(result)
+
+
+class RegexParser:
+    """
+    Thompson construction for the supported subset: literals, `.`, escapes
+    (\\d \\w \\s \\n \\t \\r), classes with ranges and `^`, groups, `|`,
+    `*`, `+` and `?`. Anchors, counted repetition and other letter or digit
+    escapes (\\S, \\b, \\x41, ...) are rejected; escaping any other
+    character matches it literally. Patterns are matched against UTF-8
+    bytes; `.` and negated classes match one whole non-ASCII character.
+    """
+    __slots__ = ['nfa', 'pattern', 'pos']
+
+    def __init__(self, nfa: NFA, pattern: str):
+        self.nfa: NFA = nfa
+        self.pattern: str = pattern
+        self.pos: int = 0
+
+    def error(self, msg: str):
+        raise ValueError('%s at %d in regex %r' % (msg, self.pos, self.pattern))
+
+    def peek(self) -> Optional[str]:
+        return self.pattern[self.pos] if self.pos < len(self.pattern) else None
+
+    def take(self) -> str:
+        if self.pos >= len(self.pattern):
+            self.error('unexpected end')
+        self.pos += 1
+        return self.pattern[self.pos - 1]
+
+    def parse(self) -> Tuple[int, int]:
+        ret = self.alternation()
+        if self.peek() is not None:
+            self.error('unexpected %r' % self.peek())
+        return ret
+
+    def alternation(self) -> Tuple[int, int]:
+        branches = [self.concatenation()]
+        while self.peek() == '|':
+            self.take()
+            branches.append(self.concatenation())
+        if len(branches) == 1:
+            return branches[0]
+
+        begin, end = self.nfa.new_state(), self.nfa.new_state()
+        for b_begin, b_end in branches:
+            self.nfa.eps[begin].append(b_begin)
+            self.nfa.eps[b_end].append(end)
+        return begin, end
+
+    def concatenation(self) -> Tuple[int, int]:
+        begin = end = self.nfa.new_state()
+        while self.peek() not in (None, '|', ')'):
+            p_begin, p_end = self.repetition()
+            self.nfa.eps[end].append(p_begin)
+            end = p_end
+        return begin, end
+
+    def repetition(self) -> Tuple[int, int]:
+        begin, end = self.atom()
+        while self.peek() in ('*', '+', '?'):
+            op = self.take()
+            n_begin, n_end = self.nfa.new_state(), self.nfa.new_state()
+            self.nfa.eps[n_begin].append(begin)
+            self.nfa.eps[end].append(n_end)
+            if op != '+':
+                self.nfa.eps[n_begin].append(n_end)
+            if op != '?':
+                self.nfa.eps[end].append(begin)
+            begin, end = n_begin, n_end
+        return begin, end
+
+    def atom(self) -> Tuple[int, int]:
+        c = self.take()
+        if c == '(':
+            ret = self.alternation()
+            if self.peek() != ')':
+                self.error('missing )')
+            self.take()
+            return ret
+        if c in ('*', '+', '?', ')'):
+            self.error('unexpected %r' % c)
+        if c in ('{', '}', '^', '$'):
+            self.error('unsupported %r' % c)
+        if c == '[':
+            negate = self.peek() == '^'
+            if negate:
+                self.take()
+            chars = self.char_class()
+            return self.char_set(ASCII - chars) if negate else self.byte_set(chars)
+        if c == '.':
+            return self.char_set(ASCII - {ord('\n')})
+        if c == '\\':
+            c = self.escape()
+            if isinstance(c, set):
+                return self.byte_set(c)
+        return self.nfa.add_bytes(c.encode())
+
+    def char_class(self) -> Set[int]:
+        ret: Set[int] = set()
+        first = True
+        while first or self.peek() != ']':
+            first = False
+            low = self.class_char()
+            if isinstance(low, set):
+                ret |= low
+                continue
+            if self.peek() == '-' and self.pattern[self.pos + 1:self.pos + 2] not in ('', ']'):
+                self.take()
+                high = self.class_char()
+                if isinstance(high, set) or high < low:
+                    self.error('bad range')
+                ret |= set(range(low, high + 1))
+            else:
+                ret.add(low)
+        self.take()
+
+        return ret
+
+    def class_char(self) -> Union[int, Set[int]]:
+        c = self.take()
+        if c == '\\':
+            c = self.escape()
+            if isinstance(c, set):
+                return c
+        if ord(c) >= 0x80:
+            self.error('non-ASCII character in class')
+        return ord(c)
+
+    def escape(self) -> Union[str, Set[int]]:
+        c = self.take()
+        if c in ESCAPES:
+            return ESCAPES[c]
+        if c.isalnum():
+            self.error('unsupported escape \\%s' % c)
+        return c
+
+    def byte_set(self, byte_set: Set[int]) -> Tuple[int, int]:
+        begin, end = self.nfa.new_state(), self.nfa.new_state()
+        self.nfa.edges[begin].append((frozenset(byte_set), end))
+        return begin, end
+
+    def char_set(self, ascii_set: Set[int]) -> Tuple[int, int]:
+        """
+        Match one character: a byte of `ascii_set` or any valid multibyte
+        UTF-8 sequence.
+        """
+        begin, end = self.byte_set(ascii_set)
+        for sequence in UTF8_SEQUENCES:
+            state = begin
+            for byte_set in sequence[:-1]:
+                state_next = self.nfa.new_state()
+                self.nfa.edges[state].append((byte_set, state_next))
+                state = state_next
+            self.nfa.edges[state].append((sequence[-1], end))
+        return begin, end
+
+
+class Lexer:
+    """
+    Terminals are defined by a literal or a regex and compiled into a single
+    minimized DFA. Input bytes are mapped to equivalence classes by `classes`
+    and `trans` is a flat `state * class_count + class` table (-1 is dead).
+    For scanning, `table` expands it to one 256-entry row per state with the
+    targets premultiplied by 256, and accepting states are numbered first.
+    The longest match wins, ties go to the rule added first. Since `.` and
+    negated classes only match whole UTF-8 characters, token values are
+    always decoded as UTF-8; input that is not valid UTF-8 at such a point
+    is reported as an unexpected character.
+    """
+    __slots__ = ['rules', 'classes', 'class_count', 'trans', 'accept', 'accept_count', 'start', 'table']
+
+    def __init__(self):
+        self.rules: List[Tuple[str, str, bool, bool]] = []
+        self.classes: bytes = b''
+        self.class_count: int = 0
+        self.trans: array = array('i')
+        self.accept: array = array('i')
+        self.accept_count: int = 0
+        self.start: int = 0
+        self.table: List[int] = []
+
+    def add_literal(self, symbol: str, text: Optional[str] = None, ignore: bool = False):
+        self.rules.append((symbol, symbol if text is None else text, False, ignore))
+        return self
+
+    def add_regex(self, symbol: str, pattern: str, ignore: bool = False):
+        self.rules.append((symbol, pattern, True, ignore))
+        return self
+
+    def calc(self):
+        nfa = NFA()
+        begin = nfa.new_state()
+        accepting: Dict[int, int] = {}
+
+        for ind, (_, text, is_regex, _) in enumerate(self.rules):
+            if is_regex:
+                r_begin, r_end = RegexParser(nfa, text).parse()
+            else:
+                r_begin, r_end = nfa.add_bytes(text.encode())
+            nfa.eps[begin].append(r_begin)
+            accepting[r_end] = ind
+
+        self.calc_classes(nfa)
+        trans, accept = self.calc_dfa(nfa, begin, accepting)
+        self.minimize(trans, accept)
+
+        if self.accept[self.start] >= 0:
+            raise ValueError('rule %s matches the empty string' % self.rules[self.accept[self.start]][0])
+
+    def calc_classes(self, nfa: NFA):
+        signatures: List[List[int]] = [[] for _ in range(BYTES)]
+        edge_id = 0
+        for edges in nfa.edges:
+            for byte_set, _ in edges:
+                for b in byte_set:
+                    signatures[b].append(edge_id)
+                edge_id += 1
+
+        class_map: Dict[Tuple[int, ...], int] = {}
+        classes = bytearray(BYTES)
+        for b, signature in enumerate(signatures):
+            classes[b] = class_map.setdefault(tuple(signature), len(class_map))
+
+        self.classes = bytes(classes)
+        self.class_count = len(class_map)
+
+    def calc_dfa(self, nfa: NFA, begin: int, accepting: Dict[int, int]) -> Tuple[List[List[int]], List[int]]:
+        edges: List[List[Tuple[FrozenSet[int], int]]] = [
+            [(frozenset(self.classes[b] for b in byte_set), end) for byte_set, end in state_edges]
+            for state_edges in nfa.edges]
+
+        states: List[FrozenSet[int]] = [nfa.closure([begin])]
+        state_ids: Dict[FrozenSet[int], int] = {states[0]: 0}
+        trans: List[List[int]] = []
+        accept: List[int] = []
+
+        for state in states:
+            moves: Dict[int, Set[int]] = {}
+            for nfa_state in state:
+                for class_set, end in edges[nfa_state]:
+                    for c in class_set:
+                        moves.setdefault(c, set()).add(end)
+
+            row = [-1] * self.class_count
+            for c, ends in moves.items():
+                target = nfa.closure(ends)
+                if target not in state_ids:
+                    state_ids[target] = len(states)
+                    states.append(target)
+                row[c] = state_ids[target]
+            trans.append(row)
+            accept.append(min((accepting[s] for s in state if s in accepting), default=-1))
+
+        return trans, accept
+
+    def minimize(self, trans: List[List[int]], accept: List[int]):
+        block = list(accept)
+        count = -1
+        while True:
+            signatures: Dict[Tuple[int, ...], int] = {}
+            new_block = [signatures.setdefault((block[s],) + tuple(block[t] if t >= 0 else -2 for t in row),
+                                               len(signatures))
+                         for s, row in enumerate(trans)]
+            block = new_block
+            if len(signatures) == count:
+                break
+            count = len(signatures)
+
+        # number accepting blocks first so the scanner tests acceptance by a single comparison
+        block_accept = [-1] * count
+        for s, b in enumerate(block):
+            block_accept[b] = accept[s]
+        order = sorted(range(count), key=lambda b: (block_accept[b] < 0, b))
+        renumber = [0] * count
+        for new, old in enumerate(order):
+            renumber[old] = new
+        block = [renumber[b] for b in block]
+
+        self.trans = array('i', [-1] * (count * self.class_count))
+        self.accept = array('i', [-1] * count)
+        for s, row in enumerate(trans):
+            base = block[s] * self.class_count
+            for c, t in enumerate(row):
+                self.trans[base + c] = block[t] if t >= 0 else -1
+            self.accept[block[s]] = accept[s]
+        self.start = block[0]
+        self.accept_count = sum(1 for a in self.accept if a >= 0)
+
+        self.table = [-1] * (count * BYTES)
+        for state in range(count):
+            base = state * self.class_count
+            for b in range(BYTES):
+                end = self.trans[base + self.classes[b]]
+                self.table[state * BYTES + b] = end * BYTES if end >= 0 else -1
+
+    def tokenize(self, data: Union[bytes, bytearray, memoryview, mmap.mmap]) -> Iterator[Token]:
+        table, accept, rules = self.table, self.accept, self.rules
+        start, limit = self.start * BYTES, self.accept_count * BYTES
+        with memoryview(data) as whole, whole.cast('B') as view:
+            pos, length = 0, len(view)
+
+            while pos < length:
+                state, matched, matched_end, i = start, -1, pos, pos
+                with view[pos:] as rest:
+                    for b in rest:
+                        state = table[state + b]
+                        if state < 0:
+                            if matched < 0 or matched_end != i:
+                                break
+                            # the token ends right before this byte, so scanning restarts on it without backing up
+                            symbol, _, _, ignore = rules[accept[matched // BYTES]]
+                            if not ignore:
+                                yield Token(symbol, str(view[pos:i], 'utf-8'))
+                            pos, matched = i, -1
+                            state = table[start + b]
+                            if state < 0:
+                                break
+                        i += 1
+                        if state < limit:
+                            matched, matched_end = state, i
+
+                if matched < 0:
+                    raise ValueError('unexpected character at %d' % pos)
+
+                symbol, _, _, ignore = rules[accept[matched // BYTES]]
+                if not ignore:
+                    yield Token(symbol, str(view[pos:matched_end], 'utf-8'))
+                pos = matched_end
+
+    def tokenize_file(self, path: str) -> Iterator[Token]:
+        with open(path, 'rb') as f:
+            if not f.seek(0, 2):
+                return
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as data:
+                yield from self.tokenize(data)
+
+    def to_string(self):
+        ret = []
+        for state in range(len(self.accept)):
+            ret.append(str(state))
+            if self.accept[state] >= 0:
+                ret.append('(' + self.rules[self.accept[state]][0] + ')')
+            ret.append(' ')
+            for c in range(self.class_count):
+                end = self.trans[state * self.class_count + c]
+                if end >= 0:
+                    ret.append(str(c) + '->' + str(end) + ' ')
+            ret.append('\n')
+        return ''.join(ret)
+
+
+if __name__ == '__main__':
+    from lalr import *
+    from lrparser import *
+
+    lexer = Lexer() \
+        .add_literal('=') \
+        .add_literal('+') \
+        .add_literal(';') \
+        .add_literal('(') \
+        .add_literal(')') \
+        .add_regex('id', r'[a-zA-Z_]\w*') \
+        .add_regex('space', r'\s+', ignore=True)
+
+    lexer.calc()
+    print(lexer.to_string())
+
+    lalr = LALRMachine('P') \
+        .add_production(Production('P', ['L'])) \
+        .add_production(Production('L', ['L', 'St'])) \
+        .add_production(Production('L', ['St'])) \
+        .add_production(Production('St', ['id', '=', 'E', ';'])) \
+        .add_production(Production('E', ['E', '+', 'T'])) \
+        .add_production(Production('E', ['T'])) \
+        .add_production(Production('T', ['(', 'E', ')'])) \
+        .add_production(Production('T', ['id']))
+
+    lalr.calc()
+
+    tree = LRParser(lalr).parse(lexer.tokenize(b'a = b + (c + d);\nx = a;\n'))
+    print(tree.to_string())
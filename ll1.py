@@ -4,7 +4,7 @@ from typing import *
 from production import *
 from grammar import *
 
-__all__ = ['LL1Machine']
+__all__ = ['LL1Machine', 'LL1PushParser']
 
 
 class LL1Machine:
@@ -80,6 +80,50 @@ class LL1Machine:
         return ''.join(ret)
 
 
+class LL1PushParser:
+    """
+    Predictive parser over a calculated `LL1Machine` table. Tokens are pushed
+    with `feed` and `close` returns the productions of the leftmost
+    derivation.
+    """
+    __slots__ = ['machine', 'stack', 'derivation', 'closed']
+
+    def __init__(self, machine: LL1Machine):
+        self.machine: LL1Machine = machine
+        self.stack: List[str] = [EOF, machine.grammar.target]
+        self.derivation: List[Production] = []
+        self.closed: bool = False
+
+    def push(self, token: Token):
+        if self.closed:
+            raise ValueError('parser is closed')
+
+        table, stack = self.machine.table, self.stack
+        while not Grammar.is_terminal(stack[-1]):
+            try:
+                rule = table[stack[-1]][token.symbol]
+            except KeyError:
+                raise ValueError('unexpected token %s' % token) from None
+            stack.pop()
+            stack.extend(reversed(rule.rule))
+            self.derivation.append(rule)
+
+        if stack[-1] != token.symbol:
+            raise ValueError('unexpected token %s' % token)
+        stack.pop()
+        if not stack:
+            self.closed = True
+
+    def feed(self, tokens: Iterable[Union[Token, str]]):
+        for token in tokens:
+            self.push(as_token(token))
+        return self
+
+    def close(self) -> List[Production]:
+        self.push(Token(EOF))
+        return self.derivation
+
+
 if __name__ == '__main__':
     """
     ll1 = LL1Machine('S') \
@@ -102,3 +146,8 @@ if __name__ == '__main__':
         .add_production(Production("F", ["id"]))
     ll1.calc_table()
     print(ll1.table_to_string())
+
+    parser = LL1PushParser(ll1)
+    parser.feed(['id', '+', '('])
+    parser.feed(['id', '*', 'id', ')'])
+    print(parser.close())
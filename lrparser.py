@@ -0,0 +1,567 @@
+#! /usr/bin/env python3
+
+from typing import *
+from grammar import *
+from production import *
+
+from lr1 import *
+
+__all__ = ['Node', 'LRParser', 'LRPushParser']
+
+
+class Node:
+    """
+    A parse tree node. `state` is the LR state the node was shifted from,
+    `size` is the number of tokens it covers; both are used to reuse the
+    node when reparsing.
+
+    The `children` of a `SeqNode` are halves of a balanced tree, not the
+    right-hand side of a production. To walk the parse tree, iterate
+    `groups()`: each group holds the children of one production, in input
+    order, without the recursive symbol itself. `unfold()` instead builds
+    the plain nested tree, in O(n) and without reuse information.
+    """
+    __slots__ = ['symbol', 'children', 'token', 'state', 'size']
+
+    def __init__(self, symbol: str, state: int,
+                 children: Optional[List['Node']] = None,
+                 token: Optional[Token] = None):
+        self.symbol: str = symbol
+        self.state: int = state
+        self.children: List[Node] = children if children is not None else []
+        self.token: Optional[Token] = token
+        self.size: int = 1 if token is not None else sum([child.size for child in self.children])
+
+    def is_leaf(self) -> bool:
+        return self.token is not None
+
+    def groups(self) -> Iterator['Node']:
+        yield self
+
+    def first_leaf(self) -> Optional['Node']:
+        pending: List[Node] = [self]
+        while pending:
+            node = pending.pop()
+            if node.is_leaf():
+                return node
+            pending.extend(reversed(node.children))
+        return None
+
+    def leaves(self) -> Iterator[Token]:
+        pending: List[Node] = [self]
+        while pending:
+            node = pending.pop()
+            if node.is_leaf():
+                yield node.token
+            pending.extend(reversed(node.children))
+
+    def unfold(self) -> 'Node':
+        """
+        Return the tree with every `SeqNode` expanded back into the nested
+        nodes of the productions it was reduced by.
+        """
+        results: List[Node] = []
+        pending: List[Tuple[Node, List[Node], bool]] = [(self, [], False)]
+        while pending:
+            node, groups, done = pending.pop()
+            if node.is_leaf():
+                results.append(node)
+                continue
+
+            if not done:
+                groups = list(node.groups())
+                pending.append((node, groups, True))
+                for group in reversed(groups):
+                    pending.extend((child, [], False) for child in reversed(group.children))
+                continue
+
+            parts = []
+            for group in reversed(groups):
+                count = len(group.children)
+                parts.append(results[len(results) - count:])
+                del results[len(results) - count:]
+            parts.reverse()
+
+            if groups[0] is node:
+                tree = Node(node.symbol, node.state, parts[0])
+            elif groups[0].base:
+                tree = Node(node.symbol, groups[0].state, parts[0])
+                for part in parts[1:]:
+                    tree = Node(node.symbol, node.state, [tree] + part)
+            else:
+                tree = Node(node.symbol, groups[-1].state, parts[-1])
+                for group, part in zip(reversed(groups[:-1]), reversed(parts[:-1])):
+                    tree = Node(node.symbol, group.state, part + [tree])
+            results.append(tree)
+
+        return results[0]
+
+    def to_string(self) -> str:
+        ret = []
+        pending: List[Tuple[Node, int]] = [(self.unfold(), 0)]
+        while pending:
+            node, indent = pending.pop()
+            ret.append('  ' * indent)
+            ret.append(str(node.token) if node.is_leaf() else node.symbol)
+            ret.append('\n')
+            pending.extend((child, indent + 1) for child in reversed(node.children))
+        return ''.join(ret)
+
+    def __str__(self):
+        return self.symbol
+
+    def __repr__(self):
+        return str(self)
+
+
+class SeqNode(Node):
+    """
+    Part of a left or right recursive sequence (`X : X a` or `X : a X`),
+    stored as a balanced tree so an edit touches O(log n) of its nodes.
+    Leaves of the balanced tree (`height` 0) are groups holding the children
+    of one production; inner nodes hold two halves. A node with `base` set
+    contains the non-recursive production and stands for a whole X; without
+    it the node is a run of items. For runs of right recursive sequences,
+    `end` is the state after the run, `last` the production of its last item
+    and `links` the (start state, production of the item before) pairs
+    inside it, which `LRParser.collapse` uses. Every group's `last` is the
+    production its children were reduced by.
+    """
+    __slots__ = ['height', 'base', 'end', 'last', 'links']
+
+    def __init__(self, symbol: str, state: int, children: List[Node], size: int, height: int, base: bool,
+                 end: int = -1, last: str = '', links: FrozenSet[Tuple[int, str]] = frozenset()):
+        self.symbol: str = symbol
+        self.state: int = state
+        self.children: List[Node] = children
+        self.token: Optional[Token] = None
+        self.size: int = size
+        self.height: int = height
+        self.base: bool = base
+        self.end: int = end
+        self.last: str = last
+        self.links: FrozenSet[Tuple[int, str]] = links
+
+    def groups(self) -> Iterator['SeqNode']:
+        pending: List[SeqNode] = [self]
+        while pending:
+            node = pending.pop()
+            if node.height == 0:
+                yield node
+            else:
+                pending.extend(reversed(node.children))
+
+
+def make_seq(a: SeqNode, b: SeqNode) -> SeqNode:
+    links = a.links
+    if a.end >= 0 and not a.base and not b.base:
+        links = a.links | b.links | {(b.state, a.last)}
+    return SeqNode(a.symbol, a.state, [a, b], a.size + b.size, max(a.height, b.height) + 1,
+                   a.base or b.base, b.end, b.last, links)
+
+
+def join(a: SeqNode, b: SeqNode) -> SeqNode:
+    """
+    Concatenate two sequences, rebalancing like an AVL tree.
+    """
+    if a.height > b.height + 1:
+        left, right = a.children
+        right = join(right, b)
+        if right.height <= left.height + 1:
+            return make_seq(left, right)
+        rl, rr = right.children
+        if rl.height > rr.height:
+            return make_seq(make_seq(left, rl.children[0]), make_seq(rl.children[1], rr))
+        return make_seq(make_seq(left, rl), rr)
+
+    if b.height > a.height + 1:
+        left, right = b.children
+        left = join(a, left)
+        if left.height <= right.height + 1:
+            return make_seq(left, right)
+        ll, lr = left.children
+        if lr.height > ll.height:
+            return make_seq(make_seq(ll, lr.children[0]), make_seq(lr.children[1], right))
+        return make_seq(ll, make_seq(lr, right))
+
+    return make_seq(a, b)
+
+
+def balance(items: List[SeqNode], begin: int, end: int) -> SeqNode:
+    if end - begin == 1:
+        return items[begin]
+    mid = (begin + end) // 2
+    return join(balance(items, begin, mid), balance(items, mid, end))
+
+
+class OpenSeq:
+    """
+    A left recursive sequence still being extended on the parse stack. Its
+    items are collected in a list and joined to `head` once by `close`, so
+    each reduction appends in O(1) instead of doing a join.
+    """
+    __slots__ = ['head', 'items']
+
+    def __init__(self, head: SeqNode, item: SeqNode):
+        self.head: SeqNode = head
+        self.items: List[SeqNode] = [item]
+
+    def append(self, item: SeqNode):
+        self.items.append(item)
+        return self
+
+    def close(self) -> SeqNode:
+        return join(self.head, balance(self.items, 0, len(self.items)))
+
+
+def split_last(node: SeqNode) -> Tuple[Optional[SeqNode], SeqNode]:
+    if node.height == 0:
+        return None, node
+    left, right = node.children
+    rest, last = split_last(right)
+    return (left if rest is None else join(left, rest)), last
+
+
+class ReuseStream:
+    """
+    Lookahead stream for `LRParser.reparse`: the old tree with the leaves in
+    [start, end) replaced by `inserted`. Old subtrees are handed out whole
+    while they neither overlap the edit nor end right before it (their last
+    reduction would have seen an edited lookahead); others are broken down.
+    The root is always broken down, it was reduced on the old end of input.
+    """
+    __slots__ = ['pending', 'inserted', 'start', 'end']
+
+    def __init__(self, tree: Node, start: int, end: int, inserted: List[Token]):
+        self.pending: List[Tuple[Node, int]] = [(tree, 0)]
+        self.inserted: List[Token] = inserted[::-1]
+        self.start: int = start
+        self.end: int = end
+        if not tree.is_leaf():
+            self.breakdown()
+
+    def peek(self) -> Union[Node, Token]:
+        while self.pending:
+            node, offset = self.pending[-1]
+            if offset >= self.end:
+                return self.inserted[-1] if self.inserted else node
+            if node.is_leaf():
+                if offset < self.start:
+                    return node
+                self.pending.pop()
+            elif offset + node.size < self.start:
+                return node
+            else:
+                self.breakdown()
+        return self.inserted[-1] if self.inserted else Token(EOF)
+
+    def breakdown(self):
+        node, offset = self.pending.pop()
+        children = []
+        for child in node.children:
+            children.append((child, offset))
+            offset += child.size
+        self.pending.extend(reversed(children))
+
+    def advance(self):
+        if self.pending and (self.pending[-1][1] < self.end or not self.inserted):
+            self.pending.pop()
+        else:
+            self.inserted.pop()
+
+
+class LRParser:
+    """
+    Table driven parser over the states of a calculated `LR1Machine` or
+    `LALRMachine`. Non-terminals defined only by left or only by right
+    recursion are built as `SeqNode`s; `sequence` maps each of their
+    productions to 'left', 'right' or 'base', and `closing` lists for each
+    production where in its rule a left recursive sequence may still be an
+    `OpenSeq`.
+    """
+    __slots__ = ['grammar', 'action', 'goto', 'sequence', 'closing']
+
+    def __init__(self, machine: LR1Machine):
+        self.grammar: Grammar = machine.grammar
+        self.action: Dict[int, Dict[str, Union[int, Production]]] = {}
+        self.goto: Dict[int, Dict[str, int]] = {}
+
+        for ind, state in enumerate(machine.states):
+            self.action[ind] = {}
+            self.goto[ind] = {}
+
+            for term, end in machine.table[ind].items():
+                if Grammar.is_terminal(term):
+                    self.action[ind][term] = end
+                else:
+                    self.goto[ind][term] = end
+
+            for production in state.productions:
+                if production.is_reduce():
+                    rule = Production(production.target, production.rule)
+                    for term in production.tail:
+                        if term in self.action[ind] and str(self.action[ind][term]) != str(rule):
+                            raise ValueError('LR conflict at state %d on %s' % (ind, term))
+                        self.action[ind][term] = rule
+
+        self.sequence: Dict[str, str] = {}
+        left_symbols: Set[str] = set()
+        for target, rules in self.grammar.production.items():
+            left = [rule for rule in rules if len(rule.rule) >= 2 and rule.rule[0] == target]
+            right = [rule for rule in rules if len(rule.rule) >= 2 and rule.rule[-1] == target]
+            if left and not right and all(target not in rule.rule[1:] for rule in left):
+                kind, recursive = 'left', left
+                left_symbols.add(target)
+            elif right and not left and all(target not in rule.rule[:-1] for rule in right):
+                kind, recursive = 'right', right
+            else:
+                continue
+            for rule in rules:
+                self.sequence[str(rule)] = kind if rule in recursive else 'base'
+
+        self.closing: Dict[str, List[int]] = {}
+        for rules in self.grammar.production.values():
+            for rule in rules:
+                skip = 0 if self.sequence.get(str(rule)) == 'left' else -1
+                self.closing[str(rule)] = [ind for ind, symbol in enumerate(rule.rule)
+                                           if symbol in left_symbols and ind != skip]
+
+    def get_action(self, state: int, token: Token) -> Union[int, Production]:
+        try:
+            return self.action[state][token.symbol]
+        except KeyError:
+            raise ValueError('unexpected token %s' % token) from None
+
+    def shift(self, stack: List[int], nodes: List[Node], token: Token, state: int):
+        nodes.append(Node(token.symbol, stack[-1], token=token))
+        stack.append(state)
+
+    def reduce(self, stack: List[int], nodes: List[Node], rule: Production, lookahead: Token) -> bool:
+        """
+        Reduce by `rule`, return True if the input is accepted.
+        """
+        key = rule.str
+        kind = self.sequence.get(key)
+        count = len(rule.rule)
+
+        if kind == 'right' and len(nodes) >= 2 and self.is_run(nodes[-2]) and \
+                self.collapse(nodes[-2], rule, lookahead):
+            count = 2
+        else:
+            self.unpack(stack, nodes, count)
+
+        children = nodes[len(nodes) - count:]
+        del nodes[len(nodes) - count:]
+        del stack[len(stack) - count:]
+
+        for ind in self.closing[key]:
+            if isinstance(children[ind], OpenSeq):
+                children[ind] = children[ind].close()
+
+        if kind is None:
+            node = Node(rule.target, stack[-1], children)
+        elif kind == 'base':
+            node = SeqNode(rule.target, stack[-1], children, sum([child.size for child in children]),
+                           0, True, last=key)
+        elif kind == 'left':
+            item = SeqNode(rule.target, children[1].state, children[1:],
+                           sum([child.size for child in children[1:]]), 0, False, last=key)
+            node = children[0].append(item) if isinstance(children[0], OpenSeq) else OpenSeq(children[0], item)
+        elif self.is_run(children[0]):
+            node = join(children[0], children[1])
+        else:
+            node = join(SeqNode(rule.target, children[0].state, children[:-1],
+                                sum([child.size for child in children[:-1]]), 0, False,
+                                children[-1].state, key), children[-1])
+        if rule.target == self.grammar.target and lookahead.symbol == EOF and len(stack) == 1:
+            nodes.append(node.close() if isinstance(node, OpenSeq) else node)
+            return True
+
+        nodes.append(node)
+
+        if rule.target not in self.goto[stack[-1]]:
+            raise ValueError('unexpected token %s' % lookahead)
+        stack.append(self.goto[stack[-1]][rule.target])
+        return False
+
+    @staticmethod
+    def is_run(node: Node) -> bool:
+        return isinstance(node, SeqNode) and not node.base
+
+    def collapse(self, run: SeqNode, rule: Production, lookahead: Token) -> bool:
+        """
+        Check that reducing `rule` with the run below the top of the stack
+        goes on to reduce every item of the run, so they can be joined with
+        the top in one step.
+        """
+        if run.last != str(rule):
+            return False
+        for begin, last in run.links:
+            end = self.goto[begin].get(rule.target)
+            act = self.action[end].get(lookahead.symbol) if end is not None else None
+            if not isinstance(act, Production) or str(act) != last:
+                return False
+        return True
+
+    def unpack(self, stack: List[int], nodes: List[Node], count: int):
+        """
+        Split runs among the top `count` stack entries until those entries
+        are single grammar symbols.
+        """
+        ind = 1
+        while ind <= count:
+            pos = len(nodes) - ind
+            run = nodes[pos]
+            if type(run) is not SeqNode or run.base:
+                ind += 1
+                continue
+
+            rest, last = split_last(run)
+            states = [child.state for child in last.children[1:]] + [run.end]
+            if rest is not None:
+                nodes[pos:pos + 1] = [rest] + last.children
+                stack[pos + 1:pos + 2] = [last.state] + states
+            else:
+                nodes[pos:pos + 1] = last.children
+                stack[pos + 1:pos + 2] = states
+
+    def shift_node(self, stack: List[int], nodes: List[Node], node: Node) -> bool:
+        if self.is_run(node):
+            if self.sequence[node.last] == 'left':
+                top = nodes[-1]
+                nodes[-1] = top.append(node) if isinstance(top, OpenSeq) else OpenSeq(top, node)
+            else:
+                nodes.append(node)
+                stack.append(node.end)
+            return True
+
+        if node.symbol not in self.goto[stack[-1]]:
+            return False
+        nodes.append(node)
+        stack.append(self.goto[stack[-1]][node.symbol])
+        return True
+
+    def parse(self, tokens: Iterable[Union[Token, str]]) -> Node:
+        """
+        Parse `tokens` into a tree. Sequence non-terminals come back as
+        `SeqNode`s, see `Node` for how to walk them.
+        """
+        return LRPushParser(self).feed(tokens).close()
+
+    def reparse(self, tree: Node, start: int, end: int, tokens: Iterable[Union[Token, str]]) -> Node:
+        """
+        Parse the leaves of `tree` with those in [start, end) replaced by
+        `tokens`. Subtrees outside the edit are shifted whole when the parser
+        reaches them in the state they were built from. Since sequences are
+        balanced, the work done grows with the size of the edit and the
+        depth of the tree rather than with the input length.
+        """
+        if not 0 <= start <= end <= tree.size:
+            raise ValueError('invalid edit range [%d, %d) for %d tokens' % (start, end, tree.size))
+
+        stream = ReuseStream(tree, start, end, list(map(as_token, tokens)))
+        stack: List[int] = [0]
+        nodes: List[Node] = []
+
+        while True:
+            item = stream.peek()
+
+            if isinstance(item, Node) and not item.is_leaf():
+                if item.state == stack[-1] and self.shift_node(stack, nodes, item):
+                    stream.advance()
+                    continue
+
+                leaf = item.first_leaf()
+                if leaf is not None:
+                    act = self.get_action(stack[-1], leaf.token)
+                    if isinstance(act, Production):
+                        self.reduce(stack, nodes, act, leaf.token)
+                        continue
+                stream.breakdown()
+                continue
+
+            token = item.token if isinstance(item, Node) else item
+            if token.symbol == EOF and stack == [0, self.goto[0].get(self.grammar.target)]:
+                # without an augmented start, a reused target subtree is shifted from state 0
+                # and the reduction that accepts in `reduce` never happens
+                top = nodes[-1].close() if isinstance(nodes[-1], OpenSeq) else nodes[-1]
+                if top.symbol == self.grammar.target and not self.is_run(top):
+                    return top
+
+            act = self.get_action(stack[-1], token)
+            if isinstance(act, int):
+                self.shift(stack, nodes, token, act)
+                stream.advance()
+            elif self.reduce(stack, nodes, act, token):
+                return nodes[-1]
+
+
+class LRPushParser:
+    """
+    Incremental form of `LRParser.parse`: tokens are pushed with `feed` as
+    they arrive and `close` returns the tree once the input has ended.
+    """
+    __slots__ = ['parser', 'stack', 'nodes', 'tree']
+
+    def __init__(self, parser: LRParser):
+        self.parser: LRParser = parser
+        self.stack: List[int] = [0]
+        self.nodes: List[Node] = []
+        self.tree: Optional[Node] = None
+
+    def push(self, token: Token):
+        if self.tree is not None:
+            raise ValueError('parser is closed')
+
+        parser, stack, nodes = self.parser, self.stack, self.nodes
+        while True:
+            act = parser.get_action(stack[-1], token)
+            if isinstance(act, int):
+                parser.shift(stack, nodes, token, act)
+                return
+            if parser.reduce(stack, nodes, act, token):
+                self.tree = nodes[-1]
+                return
+
+    def feed(self, tokens: Iterable[Union[Token, str]]):
+        for token in tokens:
+            self.push(as_token(token))
+        return self
+
+    def close(self) -> Node:
+        self.push(Token(EOF))
+        return self.tree
+
+
+if __name__ == '__main__':
+    lr1 = LR1Machine('S\'') \
+        .add_production(Production('S\'', ['S'])) \
+        .add_production(Production('S', ['S', '+', 'T'])) \
+        .add_production(Production('S', ['T'])) \
+        .add_production(Production('T', ['(', 'S', ')'])) \
+        .add_production(Production('T', ['a']))
+
+    lr1.calc()
+
+    parser = LRParser(lr1)
+    tree = parser.parse(['a', '+', '(', 'a', '+', 'a', ')'])
+    print(tree.to_string())
+
+    tree = parser.reparse(tree, 5, 6, ['(', 'a', ')', '+', 'a'])
+    print(tree.to_string())
+    print(list(tree.leaves()))
+
+    # the start symbol may be recursive without an augmented production
+    lr1 = LR1Machine('E') \
+        .add_production(Production('E', ['E', '+', 'T'])) \
+        .add_production(Production('E', ['T'])) \
+        .add_production(Production('T', ['(', 'E', ')'])) \
+        .add_production(Production('T', ['a']))
+
+    lr1.calc()
+
+    parser = LRParser(lr1)
+    tree = parser.parse(['a', '+', 'a'])
+    tree = parser.reparse(tree, 0, 1, ['(', 'a', ')'])
+    print(tree.to_string())
+    print(list(parser.reparse(tree, 0, 0, []).leaves()))